@@ -0,0 +1,265 @@
+"""
+Persistent on-disk caches for Secrev LLM responses.
+
+Responses are stored in a small SQLite database keyed by a SHA-256 digest of
+everything that determines the answer (system prompt, model, file label and
+code), so re-scanning unchanged files costs neither API latency nor tokens.
+Entries (and the semantic cache's chunks and responses) are compressed with zstd.
+
+An optional semantic cache additionally matches near-duplicate chunks through
+local sentence embeddings and a FAISS index (requires the `semantic` extra).
+"""
+import asyncio
+import hashlib
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Optional, Set
+
+import orjson
+import zstandard as zstd
+
+DEFAULT_CACHE_PATH: Path = Path.home() / ".cache" / "secrev" / "responses.db"
+DEFAULT_SEMANTIC_INDEX_PATH: Path = DEFAULT_CACHE_PATH.with_name("semantic.faiss")
+DEFAULT_EMBEDDING_MODEL_NAME: str = "sentence-transformers/all-MiniLM-L6-v2"
+DEFAULT_SEMANTIC_THRESHOLD: float = 0.95
+DEFAULT_JACCARD_THRESHOLD: float = 0.8
+SEMANTIC_SEARCH_K: int = 3
+# Stored in SQLite's user_version; a mismatch drops the responses table instead of misreading old rows.
+RESPONSE_CACHE_SCHEMA_VERSION: int = 3
+ZSTD_LEVEL: int = 3
+# Part of the semantic table's name, so a layout change starts a fresh table (and FAISS index).
+SEMANTIC_CACHE_SCHEMA_VERSION: int = 3
+_SEMANTIC_TABLE: str = f"semantic_entries_v{SEMANTIC_CACHE_SCHEMA_VERSION}"
+
+# Findings are repetitive markdown, so entries compress several-fold. The cache is only used from
+# the event loop thread, so sharing one (de)compressor is safe.
+_CCTX = zstd.ZstdCompressor(level=ZSTD_LEVEL)
+_DCTX = zstd.ZstdDecompressor()
+
+
+def _normalize_whitespace(text: str) -> str:
+    # Whitespace-only edits (re-indentation, trailing spaces, blank lines) should still hit the cache.
+    return " ".join(text.split())
+
+
+def make_cache_key(system_prompt: str, model_name: str, filepath_display: str, code_content_chunk: str) -> str:
+    parts = (str(RESPONSE_CACHE_SCHEMA_VERSION), system_prompt, model_name, filepath_display, code_content_chunk)
+    normalized = "\0".join(_normalize_whitespace(part) for part in parts)
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+def _prompt_hash(system_prompt: str) -> str:
+    return hashlib.sha256(_normalize_whitespace(system_prompt).encode("utf-8")).hexdigest()
+
+
+def _encode_entry(response: str) -> bytes:
+    return _CCTX.compress(orjson.dumps({"response": response}))
+
+
+def _decode_entry(value: bytes) -> str:
+    return orjson.loads(_DCTX.decompress(value))["response"]
+
+
+def _compress_text(text: str) -> bytes:
+    return _CCTX.compress(text.encode("utf-8"))
+
+
+def _decompress_text(value: bytes) -> str:
+    return _DCTX.decompress(value).decode("utf-8")
+
+
+class ResponseCache:
+    """Exact-match response cache backed by SQLite. A `ttl_seconds` of 0 means entries never expire."""
+
+    def __init__(self, db_path: Path = DEFAULT_CACHE_PATH, ttl_seconds: float = 0) -> None:
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(db_path))
+        schema_version = self._conn.execute("PRAGMA user_version").fetchone()[0]
+        if schema_version != RESPONSE_CACHE_SCHEMA_VERSION:
+            self._conn.execute("DROP TABLE IF EXISTS responses")
+            self._conn.execute(f"PRAGMA user_version = {RESPONSE_CACHE_SCHEMA_VERSION}")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses (hash TEXT PRIMARY KEY, value BLOB NOT NULL, ts REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[str]:
+        row = self._conn.execute("SELECT value, ts FROM responses WHERE hash = ?", (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        value, ts = row
+        if self.ttl_seconds > 0 and time.time() - ts > self.ttl_seconds:
+            self._conn.execute("DELETE FROM responses WHERE hash = ?", (key,))
+            self._conn.commit()
+            self.misses += 1
+            return None
+        try:
+            response = _decode_entry(value)
+        except (zstd.ZstdError, orjson.JSONDecodeError, KeyError, TypeError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return response
+
+    def set(self, key: str, response: str) -> None:
+        self._conn.execute(
+            "INSERT OR REPLACE INTO responses (hash, value, ts) VALUES (?, ?, ?)",
+            (key, _encode_entry(response), time.time())
+        )
+        self._conn.commit()
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+def _char_ngrams(text: str, n: int = 3) -> Set[str]:
+    normalized = _normalize_whitespace(text)
+    return {normalized[i:i + n] for i in range(max(1, len(normalized) - n + 1))}
+
+
+def ngram_jaccard(a: str, b: str) -> float:
+    a_grams, b_grams = _char_ngrams(a), _char_ngrams(b)
+    union = len(a_grams | b_grams)
+    return len(a_grams & b_grams) / union if union else 1.0
+
+
+class SemanticCache:
+    """
+    Near-duplicate response cache. Chunks are embedded with a local MiniLM model and looked up in a
+    FAISS inner-product index over L2-normalized vectors (i.e. cosine similarity). A candidate is only
+    reused when it was produced by the same LLM model and system prompt, has not outlived `ttl_seconds`
+    (0 means never) and also passes a character-trigram Jaccard check, since the embedding model only
+    sees the first few hundred tokens of a chunk.
+    """
+
+    def __init__(
+        self,
+        db_path: Path = DEFAULT_CACHE_PATH,
+        index_path: Path = DEFAULT_SEMANTIC_INDEX_PATH,
+        similarity_threshold: float = DEFAULT_SEMANTIC_THRESHOLD,
+        jaccard_threshold: float = DEFAULT_JACCARD_THRESHOLD,
+        embedding_model_name: str = DEFAULT_EMBEDDING_MODEL_NAME,
+        ttl_seconds: float = 0
+    ) -> None:
+        try:
+            import faiss
+            from sentence_transformers import SentenceTransformer
+        except ImportError as e:
+            raise ImportError(
+                f"The semantic cache requires optional dependencies ({e.name}). Install them with: pip install 'secrev[semantic]'"
+            ) from e
+        self._faiss = faiss
+        self.index_path = index_path
+        self.similarity_threshold = similarity_threshold
+        self.jaccard_threshold = jaccard_threshold
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self._dirty = False
+        self._encoder = SentenceTransformer(embedding_model_name)
+        # The tokenizer is not safe for concurrent use and torch already uses every core, so encode serially.
+        self._encode_executor = ThreadPoolExecutor(max_workers=1)
+        dimension = self._encoder.get_sentence_embedding_dimension()
+
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(db_path))
+        stale_tables = self._conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE 'semantic_entries%' AND name != ?",
+            (_SEMANTIC_TABLE,)
+        ).fetchall()
+        for (table_name,) in stale_tables:
+            self._conn.execute(f'DROP TABLE "{table_name}"')
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {_SEMANTIC_TABLE} ("
+            "vector_id INTEGER PRIMARY KEY, model TEXT NOT NULL, prompt_hash TEXT NOT NULL, filepath TEXT NOT NULL, "
+            "chunk BLOB NOT NULL, response BLOB NOT NULL, ts REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+        self._index: Any = None
+        if index_path.is_file():
+            self._index = faiss.read_index(str(index_path))
+        if self._index is not None and self._index.d == dimension:
+            # Rows committed by a run that ended before close() saved the index. Vector ids are sequential,
+            # so dropping just those keeps the entries from earlier runs in sync with the saved index.
+            self._conn.execute(f"DELETE FROM {_SEMANTIC_TABLE} WHERE vector_id >= ?", (self._index.ntotal,))
+            self._conn.commit()
+        entry_count = self._conn.execute(f"SELECT COUNT(*) FROM {_SEMANTIC_TABLE}").fetchone()[0]
+        if self._index is None or self._index.d != dimension or self._index.ntotal != entry_count:
+            # Index and metadata are out of sync (or absent); start both afresh rather than return mismatched entries.
+            self._index = faiss.IndexFlatIP(dimension)
+            self._conn.execute(f"DELETE FROM {_SEMANTIC_TABLE}")
+            self._conn.commit()
+
+    def embed(self, text: str) -> Any:
+        """Returns the query vector for `text`; pass it to `get` and `add`."""
+        return self._encoder.encode([text], normalize_embeddings=True, convert_to_numpy=True).astype("float32")
+
+    async def embed_async(self, text: str) -> Any:
+        """Like `embed`, but runs on the cache's own encoder thread so the event loop is not blocked."""
+        return await asyncio.get_running_loop().run_in_executor(self._encode_executor, self.embed, text)
+
+    def get(
+        self, model_name: str, system_prompt: str, filepath_display: str, code_content_chunk: str, query_vector: Any
+    ) -> Optional[str]:
+        if self._index.ntotal == 0:
+            return None
+        min_ts = time.time() - self.ttl_seconds if self.ttl_seconds > 0 else 0.0
+        scores, vector_ids = self._index.search(query_vector, SEMANTIC_SEARCH_K)
+        for score, vector_id in zip(scores[0], vector_ids[0]):
+            if vector_id < 0 or score < self.similarity_threshold:
+                continue
+            # Expired rows stay in the flat index (it cannot drop vectors cheaply) but are never reused.
+            row = self._conn.execute(
+                f"SELECT filepath, chunk, response FROM {_SEMANTIC_TABLE} "
+                "WHERE vector_id = ? AND model = ? AND prompt_hash = ? AND ts >= ?",
+                (int(vector_id), model_name, _prompt_hash(system_prompt), min_ts)
+            ).fetchone()
+            if row is None:
+                continue
+            try:
+                cached_filepath, cached_chunk, cached_response = row[0], _decompress_text(row[1]), _decompress_text(row[2])
+            except (zstd.ZstdError, UnicodeDecodeError):
+                continue
+            if ngram_jaccard(cached_chunk, code_content_chunk) < self.jaccard_threshold:
+                continue
+            self.hits += 1
+            return (
+                f"File: {filepath_display}\n"
+                f"_(Reused finding for a near-duplicate snippet previously reviewed as {cached_filepath}.)_\n\n"
+                f"{cached_response}"
+            )
+        return None
+
+    def add(
+        self, model_name: str, system_prompt: str, filepath_display: str, code_content_chunk: str, response: str,
+        query_vector: Any
+    ) -> None:
+        vector_id = self._index.ntotal
+        self._conn.execute(
+            f"INSERT INTO {_SEMANTIC_TABLE} (vector_id, model, prompt_hash, filepath, chunk, response, ts) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (
+                vector_id, model_name, _prompt_hash(system_prompt), filepath_display,
+                _compress_text(code_content_chunk), _compress_text(response), time.time()
+            )
+        )
+        try:
+            self._index.add(query_vector)
+        except Exception:
+            self._conn.rollback()
+            raise
+        self._conn.commit()
+        self._dirty = True
+
+    def close(self) -> None:
+        self._encode_executor.shutdown()
+        if self._dirty:
+            self.index_path.parent.mkdir(parents=True, exist_ok=True)
+            self._faiss.write_index(self._index, str(self.index_path))
+        self._conn.close()
@@ -1,22 +1,65 @@
 #!/usr/bin/env python3
 import os
+import re
 import argparse
-import json # For potential future structured output
+import asyncio
+import codecs
+import functools
+import hashlib
+import importlib.util
+import itertools
+import sqlite3
+import sys
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
-from typing import List, Set, Optional, Tuple, Dict, Any
+from typing import List, Set, Optional, Tuple, Dict, Any, Awaitable, Iterator, Union, FrozenSet, Callable, Iterable, Deque
 
+import pathspec
 from dotenv import load_dotenv
 import google.generativeai as genai
 import google.generativeai.types as genai_types # For GenerationConfig
+from google.api_core import exceptions as google_exceptions
+from tenacity import retry, retry_if_exception_type, stop_after_attempt, wait_random_exponential
+
+from secrev_cache import (
+    DEFAULT_CACHE_PATH, DEFAULT_SEMANTIC_THRESHOLD, ResponseCache, SemanticCache, make_cache_key
+)
 
 # --- Configuration ---
 DEFAULT_MODEL_NAME: str = "gemini-2.5-flash-preview-04-17"
 DEFAULT_CHUNK_SIZE_CHARS: int = 200000
 DEFAULT_MAX_TOTAL_CHARS_PROCESSED: int = 5000000
+DEFAULT_CONCURRENCY: int = 8
+MAX_API_ATTEMPTS: int = 5
+# Errors worth retrying: rate limits (429), server errors (500/503) and timeouts (504).
+TRANSIENT_API_ERRORS: Tuple[type, ...] = (
+    google_exceptions.ResourceExhausted,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.InternalServerError,
+    google_exceptions.DeadlineExceeded,
+)
+DEFAULT_PRICE_PER_MTOK: float = 0.15  # USD per 1M input tokens, used only for --dry-run estimates.
+DEFAULT_READ_WORKERS: int = 16
+BINARY_SNIFF_BYTES: int = 512
+APPROX_CHARS_PER_TOKEN: int = 4
+CONSOLE_SUMMARY_CHARS: int = 3000
+STREAM_LABEL_CHARS: int = 60
 DEFAULT_REPORTS_DIR_NAME: str = "secrev_reports"
 DEFAULT_REPORT_BASE_NAME: str = "secrev_scan"
 
+# Lines where a token-packed chunk may be cut: blank lines and top-level definitions.
+_BOUNDARY_LINE_RE = re.compile(r'\s*$|(export\s+)?(async\s+)?(def|class|function|func|fn|interface|struct|impl)\b')
+
+# (file_idx, chunk_idx, display_filepath, chunk) for one LLM request.
+AnalysisJob = Tuple[int, int, str, str]
+# (file_idx, display path, original's display path, (file_idx, chunk_idx) of the job that analyzed the original)
+# for a small file whose content is identical to one already queued for batching.
+DuplicateFile = Tuple[int, str, str, Tuple[int, int]]
+# (file_idx, display path, is_multi_chunk, content_size, (chunk_idx, chunk) iterator) for one file.
+FileChunks = Tuple[int, str, bool, int, Iterator[Tuple[int, str]]]
+
 DEFAULT_RELEVANT_EXTENSIONS: Set[str] = {
     '.py', '.js', '.ts', '.java', '.c', '.cpp', '.h', '.hpp', '.cs', '.go', '.rb', '.php',
     '.html', '.htm', '.css', '.scss', '.less',
@@ -35,6 +78,7 @@ DEFAULT_EXCLUDED_EXTENSIONS: Set[str] = {
     '.zip', '.tar', '.gz', '.rar', '.7z',
     '.pdf', '.doc', '.docx', '.xls', '.xlsx', '.ppt', '.pptx'
 }
+IGNORE_FILE_NAMES: Tuple[str, ...] = ('.gitignore', '.secrevignore')
 DEFAULT_EXCLUDED_FILENAMES_PATTERNS: Set[str] = {
     '.gitignore', 'license', 'node_modules', 'venv', '.venv', 'dist', 'build',
     '__pycache__', '.git', '.svn', '.hg',
@@ -47,7 +91,7 @@ You are an expert AI security code reviewer. Your task is to meticulously analyz
 For each potential vulnerability you identify, please provide the following information in a structured format:
 
 1.  **Vulnerability Type:** (e.g., SQL Injection, Cross-Site Scripting (XSS), Insecure Deserialization, Hardcoded Secrets, Weak Cryptography, Command Injection, Path Traversal, Insufficient Input Validation, Insecure Direct Object Reference (IDOR), Security Misconfiguration, Outdated Dependencies - if inferable from context like package files, etc.)
-2.  **File Path:** (This will be provided alongside the code snippet)
+2.  **File Path:** (This will be provided alongside the code snippet. A snippet may contain several files, each starting with a "=== File: <path> ===" marker; attribute every finding to the file it occurs in.)
 3.  **Location/Snippet:** Provide the relevant line numbers or a small, specific code snippet where the vulnerability occurs. If line numbers are not available, describe the location (e.g., "within the 'authenticate_user' function").
 4.  **Description:** Clearly explain the nature of the vulnerability and why it is a security risk.
 5.  **Potential Impact:** Briefly describe what an attacker could achieve by exploiting this vulnerability.
@@ -88,37 +132,92 @@ def load_api_key(args_api_key: Optional[str]) -> Optional[str]:
         return None
     return api_key
 
-def _should_prune_dir(dirname: str, excluded_patterns: Set[str]) -> bool:
-    lname = dirname.lower()
-    return lname in excluded_patterns
+def _scandir_walk(
+    root: str,
+    is_excluded_dir: Callable[[str, str], bool]
+) -> Iterator[Tuple[os.DirEntry, str]]:
+    """
+    Yields (DirEntry, relative_path) for every file below `root`, where relative_path uses '/' separators.
+    Directories for which `is_excluded_dir(name, relative_path)` is true are not descended into.
+    Iterative depth-first walk over os.scandir, so deep trees cannot hit the recursion limit and directory
+    entries are classified from cached DirEntry data (no stat per entry on most platforms). No Path is
+    built for directories. Like os.walk, symlinked directories are not descended into.
+    Callers filter on `entry.name` and only build a Path for files they keep.
+    """
+    stack: List[Tuple[str, str]] = [(root, "")]
+    while stack:
+        dir_path, rel_dir = stack.pop()
+        try:
+            with os.scandir(dir_path) as it:
+                for entry in it:
+                    rel_path = rel_dir + entry.name
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            if not is_excluded_dir(entry.name, rel_path):
+                                stack.append((entry.path, rel_path + "/"))
+                            continue
+                        if entry.is_symlink() and entry.is_dir():
+                            continue
+                    except OSError:
+                        continue
+                    yield entry, rel_path
+        except OSError:
+            continue
+
+def load_ignore_specs(root_dir: Path) -> List[Tuple[str, pathspec.GitIgnoreSpec]]:
+    """
+    Collects IGNORE_FILE_NAMES files from `root_dir` up to the enclosing repository root (the nearest
+    ancestor containing '.git'; just `root_dir` if there is none). Returns (prefix, spec) pairs where
+    `prefix` is `root_dir`'s path relative to the ignore file's directory, so a path relative to
+    `root_dir` can be matched as `prefix + rel_path`.
+    """
+    search_dirs = [root_dir]
+    if not (root_dir / ".git").exists():
+        for parent in root_dir.parents:
+            search_dirs.append(parent)
+            if (parent / ".git").exists():
+                break
+        else:
+            search_dirs = [root_dir]  # Not inside a repository: only the scanned directory's own files apply.
+
+    specs: List[Tuple[str, pathspec.GitIgnoreSpec]] = []
+    for base_dir in search_dirs:
+        rel_root = root_dir.relative_to(base_dir).as_posix()
+        prefix = "" if rel_root == "." else rel_root + "/"
+        for ignore_name in IGNORE_FILE_NAMES:
+            ignore_file = base_dir / ignore_name
+            try:
+                lines = ignore_file.read_text(encoding='utf-8', errors='ignore').splitlines()
+            except OSError:
+                continue
+            specs.append((prefix, pathspec.GitIgnoreSpec.from_lines(lines)))
+            print(f"    Applying ignore rules from: {ignore_file}")
+    return specs
+
+def _is_glob_pattern(pattern: str) -> bool:
+    return any(c in pattern for c in "*?[/!")
+
+def _split_extension(filename_lower: str) -> str:
+    # Same result as Path.suffix for ordinary names, without building a Path; dotfiles such as
+    # '.env' yield their full name, which the include/exclude sets already list as a name.
+    dot = filename_lower.rfind('.')
+    return filename_lower[dot:] if dot >= 0 else ''
 
 def is_excluded(
-    file_path: Path,
-    root_dir: Path,
-    excluded_extensions: Set[str],
-    excluded_filenames_patterns: Set[str]
+    filename_lower: str,
+    extension_lower: str,
+    excluded_extensions: FrozenSet[str],
+    excluded_filenames_patterns: FrozenSet[str]
 ) -> bool:
-    filename_lower = file_path.name.lower()
-    extension_lower = file_path.suffix.lower()
-
-    if extension_lower in excluded_extensions:
-        return True
-    if filename_lower in excluded_filenames_patterns:
-        return True
-    try:
-        relative_path_parts = file_path.relative_to(root_dir).parts
-        for part in relative_path_parts[:-1]:
-            if part.lower() in excluded_filenames_patterns:
-                return True
-    except ValueError:
-        pass
-    return False
+    # Excluded parent directories never reach this point: the walker prunes them.
+    return extension_lower in excluded_extensions or filename_lower in excluded_filenames_patterns
 
 def discover_code_files(
     directory_str: str,
     include_ext_cli: Optional[List[str]],
     exclude_ext_cli: Optional[List[str]],
-    exclude_files_cli: Optional[List[str]]
+    exclude_files_cli: Optional[List[str]],
+    use_ignore_files: bool = True
 ) -> List[Path]:
     discovered_files: List[Path] = []
     abs_root_dir = Path(directory_str)
@@ -126,43 +225,47 @@ def discover_code_files(
         abs_root_dir = abs_root_dir.resolve()
 
     cli_include_extensions = _normalize_extensions(include_ext_cli)
-    current_include_extensions = cli_include_extensions if cli_include_extensions else DEFAULT_RELEVANT_EXTENSIONS.copy()
-
-    current_excluded_extensions = DEFAULT_EXCLUDED_EXTENSIONS.copy()
-    current_excluded_extensions.update(_normalize_extensions(exclude_ext_cli))
+    current_include_extensions = frozenset(cli_include_extensions or DEFAULT_RELEVANT_EXTENSIONS)
+    current_excluded_extensions = frozenset(DEFAULT_EXCLUDED_EXTENSIONS | _normalize_extensions(exclude_ext_cli))
+    current_excluded_filenames_patterns = frozenset(DEFAULT_EXCLUDED_FILENAMES_PATTERNS | _normalize_patterns(exclude_files_cli))
 
-    current_excluded_filenames_patterns = DEFAULT_EXCLUDED_FILENAMES_PATTERNS.copy()
-    current_excluded_filenames_patterns.update(_normalize_patterns(exclude_files_cli))
+    # Plain names stay a set lookup against each path component; glob or path patterns
+    # (e.g. '*.min.js', '**/generated/**', 'src/legacy') are matched gitignore-style by pathspec.
+    excluded_names = frozenset(p for p in current_excluded_filenames_patterns if not _is_glob_pattern(p))
+    excluded_globs = sorted(p for p in current_excluded_filenames_patterns if _is_glob_pattern(p))
+    exclude_spec = pathspec.PathSpec.from_lines('gitwildmatch', excluded_globs) if excluded_globs else None
 
     print(f"[*] Starting file discovery in: {abs_root_dir}")
-    print(f"    Including extensions/names: {current_include_extensions if current_include_extensions else 'All (based on internal defaults, except excluded)'}")
-    print(f"    Excluding extensions: {current_excluded_extensions}")
-    print(f"    Excluding names/patterns: {current_excluded_filenames_patterns}")
+    print(f"    Including extensions/names: {set(current_include_extensions) if current_include_extensions else 'All (based on internal defaults, except excluded)'}")
+    print(f"    Excluding extensions: {set(current_excluded_extensions)}")
+    print(f"    Excluding names/patterns: {set(current_excluded_filenames_patterns)}")
 
-    for dirpath_str, dirnames, filenames in os.walk(abs_root_dir, topdown=True):
-        dirpath = Path(dirpath_str)
-        dirnames[:] = [d for d in dirnames if not _should_prune_dir(d, current_excluded_filenames_patterns)]
+    # .gitignore/.secrevignore rules are case-sensitive, like git itself.
+    ignore_specs = load_ignore_specs(abs_root_dir) if use_ignore_files else []
 
-        for filename in filenames:
-            file_path = dirpath / filename
-            if is_excluded(file_path, abs_root_dir, current_excluded_extensions, current_excluded_filenames_patterns):
-                continue
+    def is_ignored(rel_path: str) -> bool:
+        return any(spec.match_file(prefix + rel_path) for prefix, spec in ignore_specs)
 
-            ext_lower = file_path.suffix.lower()
-            filename_lower = file_path.name.lower()
+    def is_excluded_dir(name: str, rel_path: str) -> bool:
+        if name.lower() in excluded_names:
+            return True
+        if exclude_spec is not None and exclude_spec.match_file(rel_path.lower() + "/"):
+            return True
+        return is_ignored(rel_path + "/")
 
-            is_relevant = False
-            if cli_include_extensions:
-                if ext_lower in current_include_extensions or filename_lower in current_include_extensions:
-                    is_relevant = True
-            elif current_include_extensions:
-                 if ext_lower in current_include_extensions or filename_lower in current_include_extensions:
-                    is_relevant = True
-            else:
-                is_relevant = True
+    for entry, rel_path in _scandir_walk(str(abs_root_dir), is_excluded_dir):
+        filename_lower = entry.name.lower()
+        ext_lower = _split_extension(filename_lower)
 
-            if is_relevant:
-                discovered_files.append(file_path)
+        if is_excluded(filename_lower, ext_lower, current_excluded_extensions, excluded_names):
+            continue
+        if current_include_extensions and ext_lower not in current_include_extensions and filename_lower not in current_include_extensions:
+            continue
+        if exclude_spec is not None and exclude_spec.match_file(rel_path.lower()):
+            continue
+        if is_ignored(rel_path):
+            continue
+        discovered_files.append(Path(entry.path))
 
     print(f"[*] Discovered {len(discovered_files)} potentially relevant files initially.")
     return discovered_files
@@ -173,29 +276,47 @@ def _rebuild_selectable_list(
     all_discovered_files: List[Path],
     current_interactive_exclusions: Set[str],
     root_dir: Path
-) -> Tuple[List[Dict[str, Any]], List[Path]]:
+) -> Tuple[List[Path], List[str], bytearray]:
     """
     Filters the initially discovered files based on current interactive exclusions
     and rebuilds the list for display and selection.
+
+    The list is kept as parallel arrays (struct-of-arrays) indexed by position: absolute
+    paths, relative display strings and a selection flag per file. A file's display number
+    is its index + 1, so toggles and listings are plain indexed operations.
     """
-    filtered_for_display: List[Path] = []
-    for abs_path in all_discovered_files:
-        if abs_path.suffix.lower() not in current_interactive_exclusions:
-            filtered_for_display.append(abs_path)
+    paths: List[Path] = [p for p in all_discovered_files if p.suffix.lower() not in current_interactive_exclusions]
+    rel_strs: List[str] = [str(p.relative_to(root_dir)) for p in paths]
+    # All files in the rebuilt list are initially selected
+    selected = bytearray(b'\x01' * len(paths))
 
-    selectable_files_rebuilt: List[Dict[str, Any]] = []
     print("\n--- Updated File List ---")
-    if not filtered_for_display:
+    if not paths:
         print("No files remaining after applying exclusions.")
     else:
-        print(f"Found {len(filtered_for_display)} files matching current criteria:")
-        for i, abs_path in enumerate(filtered_for_display):
-            relative_path = abs_path.relative_to(root_dir)
-            # All files in the rebuilt list are initially selected
-            selectable_files_rebuilt.append({"id": i + 1, "path_obj": abs_path, "rel_path_str": str(relative_path), "selected": True})
-            print(f"  {i+1}. {str(relative_path)}")
-    
-    return selectable_files_rebuilt, filtered_for_display
+        print(f"Found {len(paths)} files matching current criteria:")
+        for i, rel_str in enumerate(rel_strs):
+            print(f"  {i+1}. {rel_str}")
+
+    return paths, rel_strs, selected
+
+
+def _select_files_with_checkbox(initial_discovered_files: List[Path], root_dir: Path) -> Optional[List[Path]]:
+    """Single-pass multi-select prompt (questionary). Returns None if the user aborts."""
+    import questionary
+
+    choices = [
+        questionary.Choice(title=str(p.relative_to(root_dir)), value=i, checked=True)
+        for i, p in enumerate(initial_discovered_files)
+    ]
+    chosen = questionary.checkbox(
+        "Select files to scan (space to toggle, 'a' to toggle all, enter to confirm):",
+        choices=choices
+    ).ask()
+    if chosen is None:
+        print("\n[*] Scan aborted by user.")
+        return None
+    return [initial_discovered_files[i] for i in sorted(chosen)]
 
 
 def review_and_filter_files_interactive(
@@ -205,13 +326,29 @@ def review_and_filter_files_interactive(
     if not initial_discovered_files:
         return []
 
+    if not sys.stdin.isatty():
+        # Nobody to answer prompts (CI, piped input): behave like --yes instead of blocking on input().
+        print(f"[*] Input is not a terminal; skipping interactive review. Proceeding with all {len(initial_discovered_files)} discovered files.")
+        return initial_discovered_files
+
     print("\n--- File Review Stage ---")
+
+    if importlib.util.find_spec("questionary") is not None:
+        final_selected_files = _select_files_with_checkbox(initial_discovered_files, root_dir)
+        if final_selected_files is not None:
+            if not final_selected_files:
+                print("[*] No files selected for analysis.")
+            else:
+                print(f"\n[*] Proceeding with {len(final_selected_files)} selected file(s).")
+        return final_selected_files
+
+    # Without questionary, fall back to the command-driven review loop.
     
     current_interactive_exclusions: Set[str] = set()
     # Build the initial list based on no interactive exclusions yet
-    selectable_files, current_shown_files = _rebuild_selectable_list(initial_discovered_files, current_interactive_exclusions, root_dir)
+    paths, rel_strs, selected = _rebuild_selectable_list(initial_discovered_files, current_interactive_exclusions, root_dir)
 
-    if not selectable_files: # No files even before interactive exclusions
+    if not paths: # No files even before interactive exclusions
         print("No files initially found to present for review.")
         return []
 
@@ -250,12 +387,12 @@ def review_and_filter_files_interactive(
                 if newly_excluded_count > 0:
                     print(f"[*] Added {extensions_to_exclude} to interactive exclusion list.")
                     # Rebuild and re-display the list
-                    selectable_files, current_shown_files = _rebuild_selectable_list(
+                    paths, rel_strs, selected = _rebuild_selectable_list(
                         initial_discovered_files, # Always filter from the original full list
                         current_interactive_exclusions,
                         root_dir
                     )
-                    if not selectable_files:
+                    if not paths:
                         print("All files have been excluded. Type 'done' to proceed with no files, or 'cancel'.")
                 else:
                     print(f"[*] Extensions {extensions_to_exclude} were already excluded or invalid.")
@@ -265,42 +402,40 @@ def review_and_filter_files_interactive(
 
         if user_input == "list":
             print("\nCurrent Selections (* indicates selected):")
-            if not selectable_files:
+            if not paths:
                 print("  No files currently in the list.")
             else:
-                for f_info in selectable_files:
-                    marker = "*" if f_info["selected"] else " "
-                    print(f"  {marker} {f_info['id']}. {f_info['rel_path_str']}")
+                for i, (rel_str, is_selected) in enumerate(zip(rel_strs, selected)):
+                    marker = "*" if is_selected else " "
+                    print(f"  {marker} {i+1}. {rel_str}")
             print(f"Currently excluded extensions (interactive): {current_interactive_exclusions if current_interactive_exclusions else 'None'}")
             continue
         
         if user_input == "all":
-            for f_info in selectable_files: f_info["selected"] = True
-            if selectable_files: print("All currently listed files selected.")
+            selected[:] = b'\x01' * len(selected)
+            if paths: print("All currently listed files selected.")
             else: print("No files to select.")
             continue
         if user_input == "none":
-            for f_info in selectable_files: f_info["selected"] = False
-            if selectable_files: print("All currently listed files deselected.")
+            selected[:] = bytes(len(selected))
+            if paths: print("All currently listed files deselected.")
             else: print("No files to deselect.")
             continue
 
         try:
             ids_to_toggle = {int(x) for x in user_input.split()}
-            valid_ids_toggled = set()
-            for f_info in selectable_files:
-                if f_info["id"] in ids_to_toggle:
-                    f_info["selected"] = not f_info["selected"]
-                    print(f"File '{f_info['rel_path_str']}' is now {'SELECTED' if f_info['selected'] else 'DESELECTED'}.")
-                    valid_ids_toggled.add(f_info["id"])
-
-            for invalid_id in ids_to_toggle - valid_ids_toggled:
-                print(f"Warning: File number {invalid_id} not found in the list.")
+            for file_id in sorted(ids_to_toggle):
+                idx = file_id - 1
+                if 0 <= idx < len(paths):
+                    selected[idx] ^= 1
+                    print(f"File '{rel_strs[idx]}' is now {'SELECTED' if selected[idx] else 'DESELECTED'}.")
+                else:
+                    print(f"Warning: File number {file_id} not found in the list.")
 
         except ValueError:
             print("Invalid input. Please enter numbers, 'all', 'none', 'list', 'exclude ...', 'done', or 'cancel'.")
 
-    final_selected_files = [f_info["path_obj"] for f_info in selectable_files if f_info["selected"]]
+    final_selected_files = [p for p, is_selected in zip(paths, selected) if is_selected]
 
     if not final_selected_files:
         print("[*] No files selected for analysis.")
@@ -308,32 +443,390 @@ def review_and_filter_files_interactive(
         print(f"\n[*] Proceeding with {len(final_selected_files)} selected file(s).")
     return final_selected_files
 
-def chunk_content(content: str, chunk_size_chars: int) -> List[str]:
-    if chunk_size_chars <= 0:
-        return [content]
-    return [content[i:i + chunk_size_chars] for i in range(0, len(content), chunk_size_chars)]
+class BinaryFileSkipped(Exception):
+    """Returned (not raised) by the file reader for files whose leading bytes look binary."""
+
+def _looks_binary(head: bytes) -> bool:
+    if not head:
+        return False
+    if b'\x00' in head:
+        return True
+    try:
+        # Incremental decode so a multi-byte character cut off at the end of `head` is not an error.
+        codecs.getincrementaldecoder('utf-8')().decode(head, final=False)
+        return False
+    except UnicodeDecodeError:
+        return sum(b > 127 for b in head) / len(head) > 0.3
+
+def is_probably_binary(file_path: Path) -> bool:
+    """Sniffs the first BINARY_SNIFF_BYTES bytes: NUL bytes, or mostly non-ASCII bytes that are not valid UTF-8."""
+    with file_path.open('rb') as f:
+        return _looks_binary(f.read(BINARY_SNIFF_BYTES))
+
+def _read_text_or_error(file_path: Path, max_inline_bytes: int = 0) -> Union[str, Exception, None]:
+    try:
+        if max_inline_bytes > 0 and file_path.stat().st_size > max_inline_bytes:
+            return BinaryFileSkipped() if is_probably_binary(file_path) else None
+        data = file_path.read_bytes()
+        if _looks_binary(data[:BINARY_SNIFF_BYTES]):
+            return BinaryFileSkipped()
+        return data.decode('utf-8', errors='ignore')
+    except Exception as e:
+        return e
+
+def iter_files_concurrently(
+    files: List[Path],
+    max_inline_bytes: int = 0,
+    max_workers: int = DEFAULT_READ_WORKERS
+) -> Iterator[Union[str, Exception, None]]:
+    """
+    Reads files on a thread pool, which overlaps per-file I/O latency (notably on network mounts and
+    spinning disks), and yields the results in order. Only `max_workers` reads run ahead of the
+    consumer, so at most that many file contents are held and reading stops when the consumer does
+    (e.g. once --max-total-chars is spent). Each result is the decoded text, the exception raised
+    while reading it, or a BinaryFileSkipped instance for files that look binary.
+    Files larger than `max_inline_bytes` (if > 0) yield None and are left for iter_chunks to stream.
+    """
+    read = functools.partial(_read_text_or_error, max_inline_bytes=max_inline_bytes)
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    pending: Deque[Future] = deque()
+    try:
+        remaining = iter(files)
+        for file_path in itertools.islice(remaining, max_workers):
+            pending.append(executor.submit(read, file_path))
+        while pending:
+            result = pending.popleft().result()
+            for file_path in itertools.islice(remaining, 1):
+                pending.append(executor.submit(read, file_path))
+            yield result
+    finally:
+        for future in pending:
+            future.cancel()
+        executor.shutdown(wait=False)
+
+def _batch_section_header(relative_path_str: str) -> str:
+    return f"=== File: {relative_path_str} ===\n"
+
+def pack_files_first_fit(sizes: List[int], bin_size: int) -> List[List[int]]:
+    """
+    First-fit bin packing: each item goes into the first bin with room left, or opens a new bin.
+    Returns the item indices per bin, in input order within each bin. Items larger than
+    `bin_size` get a bin of their own.
+    """
+    bins: List[List[int]] = []
+    remaining: List[int] = []
+    for idx, size in enumerate(sizes):
+        for bin_idx, room in enumerate(remaining):
+            if size <= room:
+                bins[bin_idx].append(idx)
+                remaining[bin_idx] -= size
+                break
+        else:
+            bins.append([idx])
+            remaining.append(bin_size - size)
+    return bins
+
+def format_file_batch(files: List[Tuple[str, str]]) -> str:
+    """Joins (relative_path, content) pairs into one snippet using the markers the system prompt describes."""
+    return "\n\n".join(f"{_batch_section_header(rel)}{content}" for rel, content in files)
 
-def analyze_code_with_llm(
+def iter_chunks(file_path: Path, chunk_size_chars: int) -> Iterator[str]:
+    """Yields the file's text `chunk_size_chars` characters at a time, so only one chunk is held in memory."""
+    with file_path.open('r', encoding='utf-8', errors='ignore') as f:
+        while True:
+            buf = f.read(chunk_size_chars if chunk_size_chars > 0 else -1)
+            if not buf:
+                break
+            yield buf
+
+@functools.lru_cache(maxsize=1)
+def _get_token_encoding() -> Any:
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:  # Not installed, or the encoding file could not be downloaded.
+        return None
+
+def count_tokens(text: str) -> int:
+    """
+    Counts tokens with tiktoken's cl100k_base encoding, a close local proxy for the Gemini tokenizer
+    that needs no API call. Falls back to ~APPROX_CHARS_PER_TOKEN characters per token without tiktoken.
+    """
+    encoding = _get_token_encoding()
+    if encoding is None:
+        return -(-len(text) // APPROX_CHARS_PER_TOKEN)
+    return len(encoding.encode_ordinary(text))
+
+def pack_lines_by_tokens(lines: Iterable[str], token_budget: int) -> Iterator[str]:
+    """
+    Greedily packs lines into chunks of at most `token_budget` tokens. When a chunk is full it is cut
+    at the last natural boundary (a blank line or a top-level def/class/function) that leaves it at least
+    half full, so the next chunk starts with a whole construct without producing tiny requests. A single
+    line over budget (e.g. minified code) is split by characters. Whitespace-only chunks are never yielded.
+    """
+    min_cut_tokens = token_budget // 2
+    buf: List[str] = []
+    buf_tokens: List[int] = []
+    total = 0
+    boundary = 0  # Index in buf of the most recent boundary line a chunk may end before; 0 means none.
+    has_content = False  # Whether buf holds a non-blank line.
+    for line in lines:
+        n = count_tokens(line)
+        if n > token_budget:
+            if has_content:
+                yield "".join(buf)
+            buf, buf_tokens, total, boundary, has_content = [], [], 0, 0, False
+            piece_len = max(1, len(line) * token_budget // n)
+            for start in range(0, len(line), piece_len):
+                piece = line[start:start + piece_len]
+                if piece.strip():
+                    yield piece
+            continue
+        while buf and total + n > token_budget:
+            cut = boundary or len(buf)
+            if has_content:
+                yield "".join(buf[:cut])
+            buf, buf_tokens = buf[cut:], buf_tokens[cut:]
+            total = sum(buf_tokens)
+            boundary = 0
+            has_content = any(l.strip() for l in buf)
+        if has_content and total >= min_cut_tokens and _BOUNDARY_LINE_RE.match(line):
+            boundary = len(buf)
+        buf.append(line)
+        buf_tokens.append(n)
+        total += n
+        has_content = has_content or bool(line.strip())
+    if has_content:
+        yield "".join(buf)
+
+def iter_token_chunks(file_path: Path, token_budget: int) -> Iterator[str]:
+    """Streams the file line by line through pack_lines_by_tokens."""
+    with file_path.open('r', encoding='utf-8', errors='ignore') as f:
+        yield from pack_lines_by_tokens(f, token_budget)
+
+def build_prompt(system_prompt: str, filepath_display: str, code_content_chunk: str) -> str:
+    return f"{system_prompt}\n\nFile: {filepath_display}\n\nCode Snippet to Analyze:\n```\n{code_content_chunk}\n```"
+
+@functools.lru_cache(maxsize=4)
+def get_model(model_name: str) -> genai.GenerativeModel:
+    """Returns a shared GenerativeModel per model name, so client setup runs once per scan rather than per chunk."""
+    return genai.GenerativeModel(model_name)
+
+class _LineEcho:
+    """Prints streamed response text to the console a complete line at a time, prefixed with its file label."""
+
+    def __init__(self, label: str) -> None:
+        # Batch labels list every member file; shorten them so each streamed line stays readable.
+        self.label = label if len(label) <= STREAM_LABEL_CHARS else label[:STREAM_LABEL_CHARS - 3] + "..."
+        self.lines_printed = 0
+        self._pending = ""
+
+    def __call__(self, text: str) -> None:
+        # Workers stream concurrently, so whole labelled lines keep interleaved output readable.
+        lines = (self._pending + text).split("\n")
+        self._pending = lines.pop()
+        for line in lines:
+            print(f"    [{self.label}] {line}")
+        self.lines_printed += len(lines)
+
+    def flush(self) -> None:
+        if self._pending:
+            print(f"    [{self.label}] {self._pending}")
+            self.lines_printed += 1
+            self._pending = ""
+
+@retry(
+    stop=stop_after_attempt(MAX_API_ATTEMPTS),
+    wait=wait_random_exponential(multiplier=1, max=30),
+    retry=retry_if_exception_type(TRANSIENT_API_ERRORS),
+    reraise=True
+)
+async def _generate_content(
+    model: genai.GenerativeModel,
+    full_prompt: str,
+    stream_label: Optional[str] = None
+) -> Any:
+    """
+    Calls the API, retrying rate limits, timeouts and 5xx errors with jittered exponential backoff.
+    Permanent errors (invalid key, bad request, permission denied) propagate on the first attempt.
+    If `stream_label` is given, the response is streamed and printed line by line under that label as
+    it arrives; the fully consumed stream is returned, so `.parts` and `.text` cover the whole response.
+    """
+    generation_config = genai_types.GenerationConfig(temperature=0.2)
+    if stream_label is None:
+        return await model.generate_content_async(full_prompt, generation_config=generation_config)
+    response = await model.generate_content_async(full_prompt, generation_config=generation_config, stream=True)
+    if response.prompt_feedback.block_reason:
+        return response  # Iterating would raise BlockedPromptException; prompt_feedback is readable without it.
+    echo = _LineEcho(stream_label)  # One per attempt, so a retry never continues a half-printed line.
+    try:
+        async for part in response:
+            if part.parts:
+                echo(part.text)
+    except Exception:
+        if echo.lines_printed:
+            print(f"    [{stream_label}] (stream interrupted; a retry prints the response from the start)")
+        raise
+    echo.flush()
+    return response
+
+async def analyze_code_with_llm(
     filepath_display: str,
     code_content_chunk: str,
     model_name: str,
-    system_prompt: str
+    system_prompt: str,
+    cache: Optional[ResponseCache] = None,
+    semantic_cache: Optional[SemanticCache] = None,
+    stream: bool = False
 ) -> str:
+    cache_key = make_cache_key(system_prompt, model_name, filepath_display, code_content_chunk)
+    if cache is not None:
+        try:
+            cached_response = cache.get(cache_key)
+        except sqlite3.Error as e:  # e.g. a locked or corrupt database; treat it as a miss.
+            print(f"    Warning: Response cache lookup failed for {filepath_display}: {e}")
+            cached_response = None
+        if cached_response is not None:
+            return cached_response
+    query_vector = None
+    if semantic_cache is not None:
+        try:
+            query_vector = await semantic_cache.embed_async(code_content_chunk)
+            similar_response = semantic_cache.get(model_name, system_prompt, filepath_display, code_content_chunk, query_vector)
+        except Exception as e:  # Encoder, FAISS or SQLite failure; the semantic cache is only an accelerator.
+            print(f"    Warning: Semantic cache lookup failed for {filepath_display}: {e}")
+            query_vector = similar_response = None
+        if similar_response is not None:
+            return similar_response
     try:
-        model = genai.GenerativeModel(model_name)
-        full_prompt = f"{system_prompt}\n\nFile: {filepath_display}\n\nCode Snippet to Analyze:\n```\n{code_content_chunk}\n```"
-        response = model.generate_content(
-            full_prompt,
-            generation_config=genai_types.GenerationConfig(temperature=0.2)
-        )
+        model = get_model(model_name)
+        full_prompt = build_prompt(system_prompt, filepath_display, code_content_chunk)
+        response = await _generate_content(model, full_prompt, stream_label=filepath_display if stream else None)
+        # Checked before .parts, which raises for a blocked prompt (and for an unconsumed stream).
+        feedback = response.prompt_feedback
+        if feedback and feedback.block_reason:
+            return f"Error: Content generation blocked for {filepath_display}. Reason: {feedback.block_reason.name}"
         if not response.parts:
-            feedback = response.prompt_feedback
-            if feedback and feedback.block_reason:
-                return f"Error: Content generation blocked for {filepath_display}. Reason: {feedback.block_reason_message or feedback.block_reason}"
             return f"Error: Received an empty response from Gemini for {filepath_display}."
-        return response.text
+        response_text = response.text
     except Exception as e:
         return f"Error during LLM API call for {filepath_display}: {e}"
+    if cache is not None:
+        try:
+            cache.set(cache_key, response_text)
+        except sqlite3.Error as e:  # The finding is already paid for; only caching it is skipped.
+            print(f"    Warning: Could not store response for {filepath_display} in the cache: {e}")
+    if semantic_cache is not None and query_vector is not None:
+        try:
+            semantic_cache.add(model_name, system_prompt, filepath_display, code_content_chunk, response_text, query_vector)
+        except Exception as e:
+            print(f"    Warning: Could not store response for {filepath_display} in the semantic cache: {e}")
+    return response_text
+
+def _chunk_digest(chunk: str) -> bytes:
+    # Whitespace-insensitive, so re-indented or re-wrapped copies also count as duplicates.
+    return hashlib.blake2b(" ".join(chunk.split()).encode('utf-8'), digest_size=16).digest()
+
+def _duplicate_finding(display_filepath: str, original_display_filepath: str, response: str) -> str:
+    return (
+        f"File: {display_filepath}\n"
+        f"_(Identical to {original_display_filepath}; its finding is repeated below.)_\n\n"
+        f"{response}"
+    )
+
+async def _run_all(
+    jobs: Iterator[AnalysisJob],
+    analyze: Callable[[str, str], Awaitable[str]],
+    concurrency: int,
+    duplicate_files: Optional[List[DuplicateFile]] = None
+) -> List[Tuple[int, int, str]]:
+    """
+    Runs `analyze(display_filepath, chunk)` over `jobs` with `concurrency` workers pulling from the
+    shared iterator, so at most `concurrency` jobs are in flight; iter_analysis_jobs bounds what it
+    holds beyond that (a read-ahead window, plus small files queued for batching).
+    Chunks identical to one already seen in this scan (vendored copies, generated code) are not
+    re-sent; they reuse that chunk's response under their own file header once it is available.
+    `duplicate_files` (filled by iter_analysis_jobs once `jobs` is exhausted) gets the same treatment
+    for small files that were deduplicated before batching.
+    Returns (file_idx, chunk_idx, response) tuples in completion order.
+    """
+    results: List[Tuple[int, int, str]] = []
+    first_seen: Dict[bytes, str] = {}  # digest -> display_filepath of the chunk actually analyzed
+    responses_by_digest: Dict[bytes, str] = {}
+    duplicates: List[Tuple[int, int, str, bytes]] = []
+
+    async def _worker() -> None:
+        # The job generator never awaits, so workers can safely share it.
+        for file_idx, chunk_idx, display_filepath, chunk in jobs:
+            digest = _chunk_digest(chunk)
+            if digest in first_seen:
+                duplicates.append((file_idx, chunk_idx, display_filepath, digest))
+                continue
+            first_seen[digest] = display_filepath
+            response = await analyze(display_filepath, chunk)
+            responses_by_digest[digest] = response
+            results.append((file_idx, chunk_idx, response))
+
+    await asyncio.gather(*(_worker() for _ in range(max(1, concurrency))))
+
+    responses_by_job = {(file_idx, chunk_idx): response for file_idx, chunk_idx, response in results}
+    for file_idx, chunk_idx, display_filepath, digest in duplicates:
+        response = responses_by_digest[digest]
+        if response:
+            results.append((file_idx, chunk_idx, _duplicate_finding(display_filepath, first_seen[digest], response)))
+    for file_idx, display_filepath, original_display_filepath, job_key in duplicate_files or []:
+        response = responses_by_job.get(job_key, "")
+        if response:
+            results.append((file_idx, 0, _duplicate_finding(display_filepath, original_display_filepath, response)))
+    n_duplicates = len(duplicates) + len(duplicate_files or [])
+    if n_duplicates:
+        print(f"[*] Reused findings for {n_duplicates} duplicate chunk(s) without calling the API.")
+    return results
+
+def estimate_scan(
+    jobs: Iterator[AnalysisJob],
+    model_name: str,
+    system_prompt: str,
+    cache: Optional[ResponseCache] = None
+) -> Tuple[int, int, int]:
+    """
+    Consumes `jobs` without calling the API and returns (requests, prompt_tokens, cached_requests).
+    Chunks that would be served by the response cache, or that duplicate an earlier chunk of this scan,
+    are not counted as requests (duplicate small files never reach `jobs`; iter_analysis_jobs drops them).
+    """
+    requests = prompt_tokens = cached_requests = 0
+    seen_digests: Set[bytes] = set()
+    for _, _, display_filepath, chunk in jobs:
+        digest = _chunk_digest(chunk)
+        if digest in seen_digests:
+            continue
+        seen_digests.add(digest)
+        if cache is not None and cache.get(make_cache_key(system_prompt, model_name, display_filepath, chunk)) is not None:
+            cached_requests += 1
+            continue
+        requests += 1
+        prompt_tokens += count_tokens(build_prompt(system_prompt, display_filepath, chunk))
+    return requests, prompt_tokens, cached_requests
+
+def _iter_report_parts(findings: List[str], report_title: str, disclaimer: str) -> Iterator[Tuple[str, str]]:
+    """Yields matching (markdown, text) report fragments in order."""
+    yield f"# {report_title}\n\n## Disclaimer\n{disclaimer}\n\n## Findings\n", f"{report_title}\n\nDisclaimer:\n{disclaimer}\n\nFindings:\n" + "="*20 + "\n\n"
+    if not findings:
+        no_findings_msg = "No potential vulnerabilities were reported by the LLM across the scanned files.\n"
+        yield no_findings_msg, no_findings_msg
+        return
+    actionable_findings_count = 0
+    for finding_text in findings:
+        is_error = "Error:" in finding_text
+        is_no_vulns = "No critical security vulnerabilities identified" in finding_text
+        if not is_error and not is_no_vulns:
+            actionable_findings_count += 1
+            yield f"---\n{finding_text}\n\n", f"------------------------\n{finding_text}\n\n"
+        elif is_error:
+            yield f"---\n**Analysis Issue:**\n{finding_text}\n\n", f"--- ANALYSIS ISSUE ---\n{finding_text}\n\n"
+    if actionable_findings_count == 0 and any("Error:" not in f for f in findings if f):
+        no_findings_msg = "The LLM reviewed the content but did not identify any critical security vulnerabilities.\n"
+        yield no_findings_msg, no_findings_msg
 
 def generate_report(
     findings: List[str],
@@ -351,45 +844,194 @@ def generate_report(
         "The findings are potential vulnerabilities and **require human verification and contextual understanding.** "
         "This tool is an aid and not a replacement for thorough manual code review, dedicated SAST/DAST tools, or professional security audits."
     )
-    md_content_parts: List[str] = [f"# {report_title}\n\n", "## Disclaimer\n", f"{disclaimer}\n\n", "## Findings\n"]
-    txt_content_parts: List[str] = [f"{report_title}\n\n", "Disclaimer:\n", f"{disclaimer}\n\n", "Findings:\n", "="*20 + "\n\n"]
-    if not findings:
-        no_findings_msg = "No potential vulnerabilities were reported by the LLM across the scanned files.\n"
-        md_content_parts.append(no_findings_msg)
-        txt_content_parts.append(no_findings_msg)
-    else:
-        actionable_findings_count = 0
-        for finding_text in findings:
-            is_error = "Error:" in finding_text
-            is_no_vulns = "No critical security vulnerabilities identified" in finding_text
-            if not is_error and not is_no_vulns:
-                actionable_findings_count += 1
-                md_content_parts.extend(["---\n", f"{finding_text}\n\n"])
-                txt_content_parts.extend([f"------------------------\n{finding_text}\n\n"])
-            elif is_error:
-                md_content_parts.extend(["---\n", f"**Analysis Issue:**\n{finding_text}\n\n"])
-                txt_content_parts.extend([f"--- ANALYSIS ISSUE ---\n{finding_text}\n\n"])
-        if actionable_findings_count == 0 and any("Error:" not in f for f in findings if f):
-            no_findings_msg = "The LLM reviewed the content but did not identify any critical security vulnerabilities.\n"
-            md_content_parts.append(no_findings_msg)
-            txt_content_parts.append(no_findings_msg)
-    md_full_content = "".join(md_content_parts)
-    txt_full_content = "".join(txt_content_parts)
+    # Fragments go straight to both files; only the first CONSOLE_SUMMARY_CHARS of markdown are kept for the console.
+    summary_parts: List[str] = []
+    summary_chars = 0
+    summary_truncated = False
+    try:
+        with md_report_file.open('w', encoding='utf-8') as md, txt_report_file.open('w', encoding='utf-8') as txt:
+            for md_part, txt_part in _iter_report_parts(findings, report_title, disclaimer):
+                md.write(md_part)
+                txt.write(txt_part)
+                if summary_chars < CONSOLE_SUMMARY_CHARS:
+                    summary_parts.append(md_part[:CONSOLE_SUMMARY_CHARS - summary_chars])
+                    summary_chars += len(summary_parts[-1])
+                    summary_truncated = summary_truncated or len(md_part) > len(summary_parts[-1])
+                else:
+                    summary_truncated = True
+        report_written = True
+    except IOError as e:
+        print(f"Error: Could not write report files {md_report_file} / {txt_report_file}: {e}")
+        report_written = False
     print("\n" + "="*20 + " Secrev Report Summary " + "="*20 + "\n")
-    summary_for_console = md_full_content
-    if len(summary_for_console) > 3000:
-        summary_for_console = summary_for_console[:3000] + "\n... (Full report saved to file)"
+    summary_for_console = "".join(summary_parts)
+    if summary_truncated:
+        summary_for_console += "\n... (Full report saved to file)"
     print(summary_for_console)
-    try:
-        md_report_file.write_text(md_full_content, encoding='utf-8')
+    if report_written:
         print(f"\n[*] Markdown report saved to: {md_report_file.resolve()}")
-    except IOError as e:
-        print(f"Error: Could not write Markdown report to file {md_report_file}: {e}")
-    try:
-        txt_report_file.write_text(txt_full_content, encoding='utf-8')
         print(f"[*] Text report saved to: {txt_report_file.resolve()}")
-    except IOError as e:
-        print(f"Error: Could not write Text report to file {txt_report_file}: {e}")
+
+def _nonempty_chunks(
+    file_idx: int,
+    relative_path_str: str,
+    code_chunks: Iterator[str],
+    indexed_findings: List[Tuple[int, int, str]]
+) -> Iterator[Tuple[int, str]]:
+    """Yields (chunk_idx, chunk) for the non-blank chunks of one file, recording streaming read errors."""
+    yielded = False
+    try:
+        for chunk_idx, chunk in enumerate(code_chunks):
+            if chunk.strip():
+                yielded = True
+                yield chunk_idx, chunk
+    except OSError as e:  # Raised by iter_chunks while streaming.
+        error_msg = f"Error: Could not read file {relative_path_str}. Reason: {e}"
+        print(f"    {error_msg}")
+        indexed_findings.append((file_idx, -1, error_msg))
+        return
+    if not yielded:
+        print(f"    Skipping empty file: {relative_path_str}")
+
+def _iter_file_chunks(
+    files_to_scan: List[Path],
+    root_dir: Path,
+    chunk_size: int,
+    chunk_tokens: int,
+    indexed_findings: List[Tuple[int, int, str]]
+) -> Iterator[FileChunks]:
+    """
+    Yields (file_idx, display path, is_multi_chunk, content_size, chunks) for each readable text file.
+    `content_size` is the file's size in tokens (or characters) when it was read inline, -1 when streamed.
+    """
+    token_mode = chunk_tokens > 0
+    chunk_budget = chunk_tokens if token_mode else chunk_size
+    max_inline_bytes = chunk_tokens * APPROX_CHARS_PER_TOKEN if token_mode else chunk_size
+    file_contents = iter_files_concurrently(files_to_scan, max_inline_bytes=max_inline_bytes)
+
+    for i, (file_path, content) in enumerate(zip(files_to_scan, file_contents)):
+        relative_path_str = str(file_path.relative_to(root_dir))
+        print(f"\n[*] Processing file {i+1}/{len(files_to_scan)}: {relative_path_str}")
+
+        if isinstance(content, BinaryFileSkipped):
+            print(f"    Skipping binary file: {relative_path_str}")
+            continue
+        code_chunks: Iterator[str]
+        try:
+            if isinstance(content, Exception):
+                raise content
+            if content is None:
+                code_chunks = iter_token_chunks(file_path, chunk_tokens) if token_mode else iter_chunks(file_path, chunk_size)
+                # Streamed because it is larger than one chunk in bytes; multi-byte text may still fit in one
+                # chunk, in which case it is labelled and batched like any other single-chunk file.
+                head = list(itertools.islice(code_chunks, 2))
+                if len(head) < 2:
+                    content = head[0] if head else ""
+                else:
+                    content_size = -1
+                    code_chunks = itertools.chain(head, code_chunks)
+            if content is not None:
+                content_size = count_tokens(content) if token_mode else len(content)
+                if content_size > chunk_budget > 0:
+                    code_chunks = pack_lines_by_tokens(content.splitlines(keepends=True), chunk_tokens)
+                else:
+                    code_chunks = iter((content,))
+        except Exception as e:
+            error_msg = f"Error: Could not read file {relative_path_str}. Reason: {e}"
+            print(f"    {error_msg}")
+            indexed_findings.append((i, -1, error_msg))
+            continue
+        is_multi_chunk = content_size < 0 or content_size > chunk_budget > 0
+        yield i, relative_path_str, is_multi_chunk, content_size, _nonempty_chunks(i, relative_path_str, code_chunks, indexed_findings)
+
+def bounded_chunks(files: Iterator[FileChunks], budget: float) -> Iterator[Tuple[int, str, bool, int, int, str]]:
+    """
+    Flattens `files` into (file_idx, display path, is_multi_chunk, content_size, chunk_idx, chunk)
+    while the chunks fit in the remaining `budget` of characters. This is the only place the
+    --max-total-chars limit is enforced: a chunk that does not fit ends its file (later, smaller
+    files may still fit), and the scan stops once the budget is spent.
+    """
+    for file_idx, relative_path_str, is_multi_chunk, content_size, chunks in files:
+        for chunk_idx, chunk in chunks:
+            if len(chunk) > budget:
+                print(f"    WARNING: Max total characters limit would be exceeded by this {'chunk' if is_multi_chunk else 'file'} ({len(chunk)} chars). Skipping the rest of this file.")
+                break
+            budget -= len(chunk)
+            yield file_idx, relative_path_str, is_multi_chunk, content_size, chunk_idx, chunk
+            if budget <= 0:
+                print("    INFO: Max total characters limit reached. Finishing remaining analysis.")
+                return
+
+def iter_analysis_jobs(
+    files_to_scan: List[Path],
+    root_dir: Path,
+    chunk_size: int,
+    max_total_chars: int,
+    batch_small_files: bool,
+    indexed_findings: List[Tuple[int, int, str]],
+    scan_stats: Dict[str, int],
+    chunk_tokens: int = 0,
+    duplicate_files: Optional[List[DuplicateFile]] = None
+) -> Iterator[AnalysisJob]:
+    """
+    Lazily yields (file_idx, chunk_idx, display_filepath, chunk) jobs for the selected files.
+    Streamed files are read one chunk at a time as jobs are consumed, so only the chunks currently
+    being analyzed are held in memory. Files that fit in one chunk are packed together (if
+    `batch_small_files`) and yielded once the other files are done; a small file identical to one
+    already queued is not packed again but appended to `duplicate_files`. Read errors are appended to
+    `indexed_findings`; `scan_stats['total_chars_processed']` tracks the characters handed out.
+    If `chunk_tokens` > 0, chunks and batches are sized in tokens instead of `chunk_size` characters.
+    """
+    token_mode = chunk_tokens > 0
+    chunk_budget = chunk_tokens if token_mode else chunk_size
+    small_files: List[Tuple[int, str, str, int]] = []
+    # Checked per file, since identical small files would otherwise land in batches with different digests.
+    small_file_by_digest: Dict[bytes, int] = {}  # digest -> index in small_files
+    small_file_duplicates: List[Tuple[int, str, int]] = []  # (file_idx, display path, index in small_files)
+    budget = max_total_chars if max_total_chars > 0 else float('inf')
+    files = _iter_file_chunks(files_to_scan, root_dir, chunk_size, chunk_tokens, indexed_findings)
+
+    # Characters are counted when a job is handed out, so the cutoff does not depend on response order.
+    for i, relative_path_str, is_multi_chunk, content_size, chunk_idx, chunk in bounded_chunks(files, budget):
+        scan_stats['total_chars_processed'] += len(chunk)
+        if batch_small_files and not is_multi_chunk:
+            digest = _chunk_digest(chunk)
+            if digest in small_file_by_digest:
+                original = small_file_by_digest[digest]
+                print(f"    Identical to {small_files[original][1]}; its finding will be reused.")
+                small_file_duplicates.append((i, relative_path_str, original))
+                continue
+            small_file_by_digest[digest] = len(small_files)
+            print(f"    Queueing file (size: {len(chunk)} chars) for batched analysis...")
+            small_files.append((i, relative_path_str, chunk, content_size))
+            continue
+        print(f"    Analyzing chunk {chunk_idx + 1} (size: {len(chunk)} chars)...")
+        display_filepath = f"{relative_path_str} (Chunk {chunk_idx+1})" if is_multi_chunk else relative_path_str
+        yield (i, chunk_idx, display_filepath, chunk)
+
+    if small_files:
+        measure: Callable[[str], int] = count_tokens if token_mode else len
+        section_sizes = [measure(_batch_section_header(rel)) + size + 2 for _, rel, _, size in small_files]
+        batches = pack_files_first_fit(section_sizes, chunk_budget)
+        print(f"\n[*] Packed {len(small_files)} file(s) into {len(batches)} request(s).")
+        job_of_small_file: Dict[int, Tuple[int, int]] = {}
+        for batch in batches:
+            for j in batch:
+                job_of_small_file[j] = (small_files[batch[0]][0], 0)
+        if duplicate_files is not None:
+            duplicate_files.extend(
+                (file_idx, rel, small_files[original][1], job_of_small_file[original])
+                for file_idx, rel, original in small_file_duplicates
+            )
+        for batch in batches:
+            members = [small_files[j] for j in batch]
+            if len(members) == 1:
+                display_filepath, chunk = members[0][1], members[0][2]
+            else:
+                # Every member is named, so errors, blocked prompts and reused findings can be traced to files.
+                display_filepath = f"{len(members)} batched files: {', '.join(rel for _, rel, _, _ in members)}"
+                chunk = format_file_batch([(rel, content) for _, rel, content, _ in members])
+            yield (members[0][0], 0, display_filepath, chunk)
 
 def main() -> int:
     parser = argparse.ArgumentParser(
@@ -417,10 +1059,36 @@ def main() -> int:
                         help="Comma-separated list of file extensions to explicitly exclude.\nAdds to internal defaults.")
     parser.add_argument("--exclude-files", type=lambda s: [item.strip() for item in s.split(',')],
                         help="Comma-separated list of specific filenames or directory patterns to exclude.\nAdds to internal defaults.")
+    parser.add_argument("--no-gitignore", action="store_true",
+                        help="Do not skip files matched by .gitignore/.secrevignore in the scanned directory or its parents (up to the repository root).")
     parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE_CHARS,
                         help=f"Max characters per code chunk sent to LLM (default: {DEFAULT_CHUNK_SIZE_CHARS}).")
+    parser.add_argument("--chunk-tokens", type=int, default=0,
+                        help="Size chunks and file batches by tokens instead of characters, cutting at blank lines or\n"
+                             "top-level definitions. Overrides --chunk-size when > 0. Counts use tiktoken's cl100k_base\n"
+                             f"as a proxy for the Gemini tokenizer (~{APPROX_CHARS_PER_TOKEN} chars/token without tiktoken). Excludes the system prompt (default: 0, off).")
     parser.add_argument("--max-total-chars", type=int, default=DEFAULT_MAX_TOTAL_CHARS_PROCESSED,
                         help=f"Safety limit on total characters processed. Set to 0 for no limit (default: {DEFAULT_MAX_TOTAL_CHARS_PROCESSED}).")
+    parser.add_argument("--no-batch", action="store_true",
+                        help="Send every file in its own request instead of packing small files together\n(more requests, but unchanged files keep hitting the response cache).")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY,
+                        help=f"Maximum number of LLM requests in flight at once (default: {DEFAULT_CONCURRENCY}).")
+    parser.add_argument("--stream", action="store_true",
+                        help="Stream LLM responses and print each line to the console as it arrives, labelled with its file.\n"
+                             "The report is still written in file order once all responses are in.")
+    parser.add_argument("--no-cache", action="store_true",
+                        help=f"Disable the on-disk LLM response cache ({DEFAULT_CACHE_PATH}).")
+    parser.add_argument("--cache-ttl", type=float, default=0,
+                        help="Seconds before a cached LLM response expires. Set to 0 to never expire (default: 0).")
+    parser.add_argument("--semantic-cache", action="store_true",
+                        help="Also reuse cached responses for near-duplicate chunks via local embeddings.\nRequires: pip install 'secrev[semantic]'.")
+    parser.add_argument("--semantic-threshold", type=float, default=DEFAULT_SEMANTIC_THRESHOLD,
+                        help=f"Minimum cosine similarity for a semantic cache hit (default: {DEFAULT_SEMANTIC_THRESHOLD}).")
+    parser.add_argument("--dry-run", "--estimate", dest="dry_run", action="store_true",
+                        help="Discover and chunk files, then print the number of requests, prompt tokens and estimated\n"
+                             "cost without calling the API (no API key needed).")
+    parser.add_argument("--price-per-mtok", type=float, default=DEFAULT_PRICE_PER_MTOK,
+                        help=f"USD per 1M input tokens used for the --dry-run cost estimate (default: {DEFAULT_PRICE_PER_MTOK}).")
     parser.add_argument("-y", "--yes", action="store_true", help="Automatically skip interactive file review.")
 
     args = parser.parse_args()
@@ -435,15 +1103,16 @@ def main() -> int:
         print(f"Error processing directory path '{args.directory}': {e}")
         return 1
 
-    api_key = load_api_key(args.api_key)
-    if not api_key:
-        return 1
-    
-    try:
-        genai.configure(api_key=api_key)
-    except Exception as e:
-        print(f"Error: Failed to configure Google Generative AI: {e}")
-        return 1
+    if not args.dry_run:
+        api_key = load_api_key(args.api_key)
+        if not api_key:
+            return 1
+
+        try:
+            genai.configure(api_key=api_key)
+        except Exception as e:
+            print(f"Error: Failed to configure Google Generative AI: {e}")
+            return 1
 
     print(f"[*] Using LLM Model: {args.model}")
 
@@ -451,7 +1120,8 @@ def main() -> int:
         str(target_directory_abs),
         args.include_extensions,
         args.exclude_extensions,
-        args.exclude_files
+        args.exclude_files,
+        use_ignore_files=not args.no_gitignore
     )
 
     if not initially_discovered_files:
@@ -471,62 +1141,83 @@ def main() -> int:
         print("[*] No files selected for analysis after review. Exiting.")
         return 0
 
-    all_llm_findings: List[str] = []
-    total_chars_processed: int = 0
+    indexed_findings: List[Tuple[int, int, str]] = []
     reports_dir = Path(args.reports_dir)
 
-    for i, file_path in enumerate(files_to_scan):
-        relative_path_str = str(file_path.relative_to(target_directory_abs))
-        print(f"\n[*] Processing file {i+1}/{len(files_to_scan)}: {relative_path_str}")
-
+    response_cache: Optional[ResponseCache] = None
+    if not args.no_cache:
         try:
-            content = file_path.read_text(encoding='utf-8', errors='ignore')
-        except Exception as e:
-            error_msg = f"Error: Could not read file {relative_path_str}. Reason: {e}"
-            print(f"    {error_msg}")
-            all_llm_findings.append(error_msg)
-            continue
-
-        if not content.strip():
-            print(f"    Skipping empty file: {relative_path_str}")
-            continue
+            response_cache = ResponseCache(DEFAULT_CACHE_PATH, ttl_seconds=args.cache_ttl)
+        except (OSError, sqlite3.Error) as e:
+            print(f"Warning: Could not open response cache at {DEFAULT_CACHE_PATH}: {e}. Continuing without cache.")
 
-        content_len = len(content)
-        if args.max_total_chars > 0 and (total_chars_processed + content_len > args.max_total_chars) and total_chars_processed < args.max_total_chars:
-            print(f"    WARNING: Max total characters limit ({args.max_total_chars}) would be exceeded by this file's content ({content_len} chars). Skipping file.")
-            continue
+    semantic_cache: Optional[SemanticCache] = None
+    if args.semantic_cache and not args.no_cache and not args.dry_run:
+        try:
+            semantic_cache = SemanticCache(
+                DEFAULT_CACHE_PATH, similarity_threshold=args.semantic_threshold, ttl_seconds=args.cache_ttl
+            )
+        except ImportError as e:
+            print(f"Warning: {e}. Continuing without semantic cache.")
+        except (OSError, sqlite3.Error) as e:
+            print(f"Warning: Could not open semantic cache: {e}. Continuing without semantic cache.")
 
-        code_chunks = chunk_content(content, args.chunk_size)
+    # Files that fit in one chunk are packed together into shared requests; each one costs a full
+    # round trip otherwise. Anything larger than one chunk on disk is streamed rather than read whole.
+    batch_small_files = not args.no_batch and (args.chunk_size > 0 or args.chunk_tokens > 0)
+    scan_stats: Dict[str, int] = {'total_chars_processed': 0}
+    duplicate_files: List[DuplicateFile] = []
+    jobs = iter_analysis_jobs(
+        files_to_scan,
+        target_directory_abs,
+        args.chunk_size,
+        args.max_total_chars,
+        batch_small_files,
+        indexed_findings,
+        scan_stats,
+        chunk_tokens=args.chunk_tokens,
+        duplicate_files=duplicate_files
+    )
+    if args.dry_run:
+        n_requests, prompt_tokens, cached_requests = estimate_scan(jobs, args.model, SECURITY_ANALYSIS_SYSTEM_PROMPT, response_cache)
+        if response_cache is not None:
+            response_cache.close()
+        estimated_cost = prompt_tokens / 1_000_000 * args.price_per_mtok
+        print("\n[*] Dry run: no API calls were made.")
+        print(f"[*] Estimated: {n_requests} requests, {prompt_tokens} prompt tokens (~${estimated_cost:.2f} at ${args.price_per_mtok}/1M input tokens).")
+        if duplicate_files:
+            print(f"[*] {len(duplicate_files)} small file(s) are identical to another and would not be sent.")
+        if cached_requests:
+            print(f"[*] {cached_requests} further request(s) would be served from the response cache.")
+        print(f"[*] Total characters that would be processed: {scan_stats['total_chars_processed']}")
+        return 0
 
-        for chunk_idx, chunk in enumerate(code_chunks):
-            if not chunk.strip():
-                continue
-            chunk_len = len(chunk)
-            if args.max_total_chars > 0 and (total_chars_processed + chunk_len > args.max_total_chars) and total_chars_processed < args.max_total_chars:
-                print(f"    INFO: Max total characters limit ({args.max_total_chars}) would be exceeded by this chunk. Stopping analysis for this file.")
-                break
-            print(f"    Analyzing chunk {chunk_idx + 1}/{len(code_chunks)} (size: {chunk_len} chars)...")
-            display_filepath = f"{relative_path_str} (Chunk {chunk_idx+1}/{len(code_chunks)})" if len(code_chunks) > 1 else relative_path_str
-            llm_response = analyze_code_with_llm(
-                display_filepath,
-                chunk,
-                args.model,
-                SECURITY_ANALYSIS_SYSTEM_PROMPT
-            )
-            if llm_response:
-                all_llm_findings.append(llm_response)
-            total_chars_processed += chunk_len
-            if args.max_total_chars > 0 and total_chars_processed >= args.max_total_chars:
-                if i < len(files_to_scan) - 1 or chunk_idx < len(code_chunks) -1:
-                    print(f"    INFO: Max total characters limit ({args.max_total_chars}) reached. Moving to report generation.")
-                break
-        if args.max_total_chars > 0 and total_chars_processed >= args.max_total_chars:
-            break
+    analyze = functools.partial(
+        analyze_code_with_llm,
+        model_name=args.model,
+        system_prompt=SECURITY_ANALYSIS_SYSTEM_PROMPT,
+        cache=response_cache,
+        semantic_cache=semantic_cache,
+        stream=args.stream
+    )
+    print(f"\n[*] Analyzing with up to {args.concurrency} concurrent request(s)...")
+    indexed_findings.extend(
+        (file_idx, chunk_idx, response)
+        for file_idx, chunk_idx, response in asyncio.run(_run_all(jobs, analyze, args.concurrency, duplicate_files))
+        if response
+    )
+    if response_cache is not None:
+        print(f"[*] Response cache: {response_cache.hits} hit(s), {response_cache.misses} miss(es).")
+        response_cache.close()
+    if semantic_cache is not None:
+        print(f"[*] Semantic cache: {semantic_cache.hits} near-duplicate hit(s).")
+        semantic_cache.close()
+    indexed_findings.sort(key=lambda item: (item[0], item[1]))
+    all_llm_findings: List[str] = [finding for _, _, finding in indexed_findings]
 
     generate_report(all_llm_findings, args.output_file_base, reports_dir.resolve())
-    print(f"\n[*] Secrev scan complete. Total characters processed: {total_chars_processed}")
+    print(f"\n[*] Secrev scan complete. Total characters processed: {scan_stats['total_chars_processed']}")
     return 0
 
 if __name__ == "__main__":
-    import sys
     sys.exit(main())
\ No newline at end of file